@@ -5,6 +5,24 @@ import uvicorn
 from .app import create_app
 
 
+def _uvicorn_speedups() -> dict:
+    """Prefer uvloop/httptools when installed, otherwise fall back to uvicorn's pure-Python defaults."""
+    options = {}
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        options["loop"] = "uvloop"
+    try:
+        import httptools  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        options["http"] = "httptools"
+    return options
+
+
 def main():
     parser = argparse.ArgumentParser(prog="cylindria", description="Cylindria reverse-proxy for ComfyUI")
     parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
@@ -28,7 +46,14 @@ def main():
     logging.basicConfig(level=logging.INFO)
 
     app = create_app(settings)
-    uvicorn.run(app, host=args.host, port=args.port)
+    uvicorn.run(
+        app,
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+        access_log=False,
+        **_uvicorn_speedups(),
+    )
 
 
 if __name__ == "__main__":
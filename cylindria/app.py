@@ -1,15 +1,21 @@
 import asyncio
+import logging
 from contextlib import asynccontextmanager
 from typing import Any
 from urllib.parse import urlparse, urlunparse
 
-from fastapi import Depends, FastAPI, HTTPException, Query, status
+import httpx
+from fastapi import Depends, FastAPI, HTTPException, Query, Response, status
 
 from .comfy_client import ComfyClient
 from .config import Settings, get_settings
 from .jobs import JobStore
 from .models import JobStatusResponse, StartJobResponse
-from .security import require_api_key
+from .responses import ORJSONResponse
+from .security import build_api_key_guard
+
+
+logger = logging.getLogger(__name__)
 
 
 def _looks_like_node_definition(candidate: Any) -> bool:
@@ -22,12 +28,15 @@ def _normalize_workflow_payload(workflow: dict[str, Any]) -> dict[str, Any]:
 
     prompt_section = workflow.get("prompt")
     if isinstance(prompt_section, dict):
-        nodes_outside_prompt = {
-            key: value
-            for key, value in workflow.items()
-            if key != "prompt" and _looks_like_node_definition(value)
-        }
-        if not nodes_outside_prompt:
+        # Single pass; the dict is only created once a node outside "prompt" turns up
+        nodes_outside_prompt: dict[str, Any] | None = None
+        for key, value in workflow.items():
+            if key != "prompt" and _looks_like_node_definition(value):
+                if nodes_outside_prompt is None:
+                    nodes_outside_prompt = {}
+                nodes_outside_prompt[key] = value
+        if nodes_outside_prompt is None:
+            # Common case: everything already lives under "prompt"
             return workflow
         merged_prompt = dict(prompt_section)
         merged_prompt.update(nodes_outside_prompt)
@@ -75,41 +84,77 @@ def _build_gpu_base_url(base_url: str, gpu_id: int, default_port: int = 8188) ->
     return urlunparse(rebuilt)
 
 
+def _use_http2(base_url: str) -> bool:
+    """HTTP/2 only helps behind a TLS proxy (httpx negotiates it via ALPN) and needs h2 installed."""
+    if urlparse(base_url).scheme != "https":
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
 def create_app(settings: Settings | None = None) -> FastAPI:
     settings = settings or get_settings()
 
     job_store = JobStore()
     dev_dir = settings.dev_save_dir if getattr(settings, "dev_mode", False) else None
-    comfy_clients: dict[int, ComfyClient] = {}
-    for gpu_id in range(settings.number_of_gpus):
-        gpu_base_url = _build_gpu_base_url(settings.comfyui_base_url, gpu_id)
-        comfy_clients[gpu_id] = ComfyClient(
-            base_url=gpu_base_url,
+    # GPU ids are contiguous 0..N-1, so a tuple indexed by gpu_id is enough
+    comfy_clients: tuple[ComfyClient, ...] = tuple(
+        ComfyClient(
+            base_url=_build_gpu_base_url(settings.comfyui_base_url, gpu_id),
             job_store=job_store,
             gpu_id=gpu_id,
             dev_save_dir=dev_dir,
+            max_concurrent_submits=settings.max_concurrent_submits,
+        )
+        for gpu_id in range(settings.number_of_gpus)
+    )
+
+    def _build_http_client() -> httpx.AsyncClient:
+        # One keep-alive pool for every GPU so /prompt, /queue and ping calls reuse connections
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(2.0, connect=1.0),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=128, keepalive_expiry=30.0),
+            http2=_use_http2(settings.comfyui_base_url),
         )
 
-    async def _start_clients():
-        if not comfy_clients:
-            return
-        await asyncio.gather(*(client.ensure_ws_listener() for client in comfy_clients.values()))
+    def _start_clients(http_client: httpx.AsyncClient):
+        for client in comfy_clients:
+            client.start_background_tasks(http_client)
 
     async def _stop_clients():
         if not comfy_clients:
             return
-        await asyncio.gather(*(client.stop_ws_listener() for client in comfy_clients.values()))
+        # One failing client must not keep the others from shutting down
+        results = await asyncio.gather(
+            *(client.stop_ws_listener() for client in comfy_clients),
+            return_exceptions=True,
+        )
+        for client, result in zip(comfy_clients, results):
+            if isinstance(result, Exception):
+                logger.warning("Stopping ComfyClient gpu_id=%s failed: %r", client.gpu_id, result)
 
     @asynccontextmanager
     async def lifespan(_: FastAPI):
-        await _start_clients()
+        # Built per startup: the pool is closed on shutdown and the app may be started again
+        http_client = _build_http_client()
+        _start_clients(http_client)
         try:
             yield
         finally:
             await _stop_clients()
-
-    app = FastAPI(title="Cylindria", version="0.1.0", lifespan=lifespan)
+            await http_client.aclose()
+
+    app = FastAPI(
+        title="Cylindria",
+        version="0.1.0",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse,
+    )
     max_gpu_id = max(0, settings.number_of_gpus - 1)
+    require_api_key = build_api_key_guard(settings)
 
     @app.get("/serverstatus")
     async def server_status(
@@ -126,7 +171,8 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         }
 
 
-    @app.put("/startjob/{job_id}/", response_model=StartJobResponse)
+    # Returns the response directly; StartJobResponse only documents it in OpenAPI
+    @app.put("/startjob/{job_id}/", responses={200: {"model": StartJobResponse}})
     async def start_job(
         job_id: str,
         workflow: dict[str, Any],
@@ -138,13 +184,14 @@ def create_app(settings: Settings | None = None) -> FastAPI:
         accepted, detail = await client.submit_workflow(job_id, normalized_workflow)
         if not accepted:
             raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail)
-        return StartJobResponse(job_id=job_id, accepted=accepted, detail=detail, gpu_id=gpu_id)
+        return ORJSONResponse({"job_id": job_id, "accepted": accepted, "detail": detail, "gpu_id": gpu_id})
 
-    @app.get("/jobstatus/{job_id}/", response_model=JobStatusResponse)
+    # Served from JobStore's cached JSON bytes; JobStatusResponse only documents it in OpenAPI
+    @app.get("/jobstatus/{job_id}/", responses={200: {"model": JobStatusResponse}})
     async def job_status(job_id: str, api_key: str | None = Depends(require_api_key)):
-        status_obj = job_store.get(job_id)
-        if not status_obj:
+        payload = job_store.get_json(job_id)
+        if payload is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
-        return status_obj
+        return Response(content=payload, media_type="application/json")
 
     return app
@@ -3,14 +3,17 @@ from __future__ import annotations
 import asyncio
 import base64
 import contextlib
-import json
 import logging
+import random
+import re
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Optional, Tuple
+from typing import Any, Callable, Optional, Tuple
 from urllib.parse import urlparse, urlunparse
 
 import httpx
+import orjson
 import websockets
 from websockets.exceptions import ConnectionClosed
 
@@ -19,6 +22,88 @@ from .jobs import JobStore
 
 logger = logging.getLogger(__name__)
 
+# Job state implied by the ComfyUI websocket event types we know about.
+# None means the event carries no state change: "executing" is also sent with
+# node=None after execution_success, and execution_cached/progress_state are
+# informational.
+_EVENT_TO_STATE: dict[str, str | None] = {
+    "execution_start": "running",
+    "executed": "running",
+    "execution_success": "completed",
+    "execution_error": "failed",
+    "execution_interrupted": "failed",
+    "executing": None,
+    "execution_cached": None,
+    "progress": None,
+    "progress_state": None,
+    "status": None,
+}
+# Keyword fallback for event types missing from _EVENT_TO_STATE
+_RUNNING_KEYWORDS = re.compile(r"start|running|execute")
+_COMPLETED_KEYWORDS = re.compile(r"complete|finish|done")
+_FAILED_KEYWORDS = re.compile(r"fail|error|abort")
+
+# Share of the overall job progress covered by each known sampler node, as
+# (scale, offset) applied to that node's own 0-100% progress. ComfyUI sends
+# node ids as strings.
+_NODE_PROGRESS: dict[str, tuple[float, float]] = {
+    "57": (0.40, 0.0),
+    "58": (0.40, 40.0),
+    "85": (0.20, 80.0),
+}
+# Other nodes only count when they report just a few steps
+_SHORT_STEP_PROGRESS = (0.50, 0.0)
+
+
+# Websocket event handlers. Each gets the decoded payload and the lowercased
+# event type and returns (new state or None for no change, progress percent or None).
+_EventHandler = Callable[[dict, str], Tuple[Optional[str], Optional[int]]]
+
+
+def _handle_progress(payload: dict, event: str) -> Tuple[Optional[str], Optional[int]]:
+    data = payload.get("data")
+    if not isinstance(data, dict):
+        return None, None
+    current = data.get("value")
+    total = data.get("max")
+    # No NaN/inf checks needed: orjson rejects non-finite numbers while parsing
+    if not (isinstance(current, (int, float)) and isinstance(total, (int, float)) and total > 0):
+        return None, None
+    node = data.get("node")
+    weights = _NODE_PROGRESS.get(node) if isinstance(node, str) else None
+    if weights is None and total < 10:
+        weights = _SHORT_STEP_PROGRESS
+    if weights is None:
+        return None, None
+    scale, offset = weights
+    computed_percent = min(current, total) / total * 100.0
+    percent = int(round(max(0.0, min(100.0, computed_percent * scale + offset))))
+    return ("completed" if percent >= 100 else "running"), percent
+
+
+def _handle_generic(payload: dict, event: str) -> Tuple[Optional[str], Optional[int]]:
+    """Unknown event types fall back to keyword matching."""
+    if _RUNNING_KEYWORDS.search(event):
+        return "running", None
+    if _COMPLETED_KEYWORDS.search(event):
+        return "completed", None
+    if _FAILED_KEYWORDS.search(event):
+        return "failed", None
+    return None, None
+
+
+def _fixed_state_handler(state: Optional[str]) -> _EventHandler:
+    def handler(payload: dict, event: str) -> Tuple[Optional[str], Optional[int]]:
+        return state, None
+
+    return handler
+
+
+_HANDLERS: dict[str, _EventHandler] = {
+    event: _fixed_state_handler(state) for event, state in _EVENT_TO_STATE.items()
+}
+_HANDLERS["progress"] = _handle_progress
+
 
 class ComfyClient:
     """Thin helper to talk to ComfyUI, with graceful fallbacks."""
@@ -29,27 +114,50 @@ class ComfyClient:
         job_store: JobStore,
         gpu_id: int = 0,
         dev_save_dir: Optional[str] = None,
+        max_concurrent_submits: int = 4,
     ) -> None:
         self.base_url = base_url.rstrip('/')
         self.job_store = job_store
         self.gpu_id = gpu_id
-        self._client = httpx.AsyncClient(timeout=httpx.Timeout(2.0, connect=1.0))
+        # Shared across all GPU clients; handed in by start_background_tasks on
+        # every app startup and closed by the app on shutdown
+        self._client: httpx.AsyncClient | None = None
         self.dev_save_dir = Path(dev_save_dir) if dev_save_dir else None
+        # Endpoint URLs are fixed per client, build them once
+        self._url_ping = f"{self.base_url}/"
+        self._url_prompt = f"{self.base_url}/prompt"
+        self._url_queue = f"{self.base_url}/queue"
         self._ws_url = self._build_ws_url(self.base_url)
         self._ws_task: asyncio.Task | None = None
         self._queue_poll_task: asyncio.Task | None = None
+        self._update_flush_task: asyncio.Task | None = None
+        # Latest not-yet-applied websocket update per job_id, see _record_job_update
+        self._pending_updates: dict[str, dict[str, Any]] = {}
         self._listener_lock = asyncio.Lock()
+        # Bounds in-flight /prompt POSTs so request bursts queue here rather than in the pool
+        self._submit_sem = asyncio.Semaphore(max_concurrent_submits)
         if self.dev_save_dir:
             self._ws_log_dir = self.dev_save_dir / f"ws_logs_gpu_{self.gpu_id}"
+            # Created once here instead of on every submission / reconnect
+            try:
+                self._ws_log_dir.mkdir(parents=True, exist_ok=True)
+            except OSError as exc:
+                logger.warning("Could not create dev save dir %s: %s", self._ws_log_dir, exc)
         else:
             self._ws_log_dir = None
+        # Dev-mode websocket log: one file per client lifetime, opened on first write
+        self._ws_log_handle = None
+        # Encoded websocket log records waiting for the next batched write
+        self._ws_log_buffer: list[bytes] = []
+        self._ws_log_buffered_bytes = 0
         self._last_running_prompt: str | None = None
+        self._last_ws_event_monotonic: float = 0.0
 
     @staticmethod
     def _extract_prompt_id(response: httpx.Response) -> str | None:
         try:
-            payload = response.json()
-        except ValueError:
+            payload = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
             return None
         if isinstance(payload, dict):
             prompt_id = payload.get('prompt_id')
@@ -65,46 +173,80 @@ class ComfyClient:
         return urlunparse((scheme, parsed.netloc, ws_path, '', '', ''))
 
 
+    _WS_LOG_FLUSH_INTERVAL = 0.05  # seconds between batched websocket log writes
+    _WS_LOG_FLUSH_BYTES = 32 * 1024  # write early once this much is buffered
+
     def _open_ws_log(self):
         if self._ws_log_dir is None:
             return None
         try:
-            self._ws_log_dir.mkdir(parents=True, exist_ok=True)
             timestamp = datetime.now(timezone.utc).strftime("ws_%Y%m%dT%H%M%S.%fZ.log")
-            return (self._ws_log_dir / timestamp).open("a", encoding="utf-8")
+            return (self._ws_log_dir / timestamp).open("ab", buffering=1 << 16)
         except Exception:
             return None
 
-    def _log_ws_message(self, log_handle, payload):
-        if log_handle is None:
-            return
+    def _log_ws_message(self, payload: bytes):
+        # Epoch nanoseconds; much cheaper per frame than building an aware datetime
         record = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "ts_ns": time.time_ns(),
             "direction": "upstream",
         }
-        if isinstance(payload, bytes):
+        if payload.startswith(b"{"):
+            record["kind"] = "text"
+            record["payload"] = payload.decode("utf-8", "replace")
+        else:
             record["kind"] = "binary"
             record["payload_b64"] = base64.b64encode(payload).decode("ascii")
-        else:
-            record["kind"] = "text"
-            record["payload"] = payload
+        encoded = orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+        # Buffered here and written in batches by _ws_log_flush_loop
+        self._ws_log_buffer.append(encoded)
+        self._ws_log_buffered_bytes += len(encoded)
+        if self._ws_log_buffered_bytes >= self._WS_LOG_FLUSH_BYTES:
+            self._write_ws_log_buffer()
+
+    def _write_ws_log_buffer(self) -> None:
+        if not self._ws_log_buffer:
+            return
+        chunk = b"".join(self._ws_log_buffer)
+        self._ws_log_buffer.clear()
+        self._ws_log_buffered_bytes = 0
+        if self._ws_log_handle is None:
+            self._ws_log_handle = self._open_ws_log()
+            if self._ws_log_handle is None:
+                return
         try:
-            log_handle.write(json.dumps(record, ensure_ascii=False) + "\n")
-            log_handle.flush()
+            self._ws_log_handle.write(chunk)
+            self._ws_log_handle.flush()
         except Exception:
             pass
 
+    def _close_ws_log(self) -> None:
+        self._write_ws_log_buffer()
+        log_handle = self._ws_log_handle
+        self._ws_log_handle = None
+        if log_handle is not None:
+            try:
+                log_handle.close()
+            except Exception:
+                pass
 
-
-    async def ensure_ws_listener(self) -> None:
-        async with self._listener_lock:
-            if self._ws_task and not self._ws_task.done():
-                return
+    async def _ws_log_flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._WS_LOG_FLUSH_INTERVAL)
+            self._write_ws_log_buffer()
+
+    def start_background_tasks(self, http_client: httpx.AsyncClient) -> None:
+        """
+        Use http_client for ComfyUI HTTP calls and start the websocket listener, update
+        flusher and queue poller if not running.
+        Nothing here awaits, so no other coroutine can interleave and no lock is needed.
+        """
+        self._client = http_client
+        if not self._ws_task or self._ws_task.done():
             self._ws_task = asyncio.create_task(self._ws_listener_loop())
-
-            # Also start queue polling
-            if self._queue_poll_task and not self._queue_poll_task.done():
-                return
+        if not self._update_flush_task or self._update_flush_task.done():
+            self._update_flush_task = asyncio.create_task(self._update_flush_loop())
+        if not self._queue_poll_task or self._queue_poll_task.done():
             self._queue_poll_task = asyncio.create_task(self._queue_polling_loop())
 
     async def stop_ws_listener(self) -> None:
@@ -113,6 +255,8 @@ class ComfyClient:
             self._ws_task = None
             queue_task = self._queue_poll_task
             self._queue_poll_task = None
+            flush_task = self._update_flush_task
+            self._update_flush_task = None
 
         # Cancel WS task
         if ws_task:
@@ -126,48 +270,74 @@ class ComfyClient:
             with contextlib.suppress(asyncio.CancelledError):
                 await queue_task
 
+        # Cancel the flusher and apply whatever it had not written yet
+        if flush_task:
+            flush_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await flush_task
+        self._flush_pending_updates()
+        self._close_ws_log()
+
     async def _ws_listener_loop(self) -> None:
         backoff = 1.0
         while True:
             try:
                 async with websockets.connect(self._ws_url, ping_interval=None, max_size=None) as ws:
                     backoff = 1.0
-                    log_handle = self._open_ws_log()
-                    try:
-                        await self._consume_ws(ws, log_handle)
-                    finally:
-                        if log_handle is not None:
-                            try:
-                                log_handle.close()
-                            except Exception:
-                                pass
+                    # Pick the consumer once per connection so the common,
+                    # non-dev path carries no logging work per frame
+                    if self._ws_log_dir is None:
+                        await self._consume_ws(ws)
+                    else:
+                        flush_task = asyncio.create_task(self._ws_log_flush_loop())
+                        try:
+                            await self._consume_ws_logging(ws)
+                        finally:
+                            flush_task.cancel()
+                            with contextlib.suppress(asyncio.CancelledError):
+                                await flush_task
+                            self._write_ws_log_buffer()
             except asyncio.CancelledError:
                 raise
             except Exception:
-                await asyncio.sleep(backoff)
+                # Full jitter so clients for several GPUs don't retry in lockstep
+                await asyncio.sleep(random.uniform(0.0, backoff))
                 backoff = min(backoff * 2.0, 30.0)
 
-    async def _consume_ws(self, ws, log_handle=None) -> None:
+    async def _consume_ws(self, ws) -> None:
         try:
-            async for message in ws:
-                if isinstance(message, bytes):
-                    try:
-                        decoded = message.decode('utf-8')
-                    except Exception:
-                        self._log_ws_message(log_handle, message)
-                        continue
-                    self._log_ws_message(log_handle, decoded)
-                    message = decoded
-                else:
-                    self._log_ws_message(log_handle, message)
-                await self._handle_ws_message(message)
+            while True:
+                # Raw frame bytes: text frames skip the UTF-8 decode to str and
+                # orjson parses the bytes directly
+                message = await ws.recv(decode=False)
+                # Status events are JSON objects; anything else is a binary
+                # preview image we don't dispatch
+                if message.startswith(b"{"):
+                    await self._handle_ws_message(message)
         except ConnectionClosed:
             return
 
-    async def _handle_ws_message(self, message: str) -> None:
+    async def _consume_ws_logging(self, ws) -> None:
+        """Same as _consume_ws, additionally logging every frame (dev mode)."""
         try:
-            payload = json.loads(message)
-        except json.JSONDecodeError:
+            while True:
+                message = await ws.recv(decode=False)
+                self._log_ws_message(message)
+                if message.startswith(b"{"):
+                    await self._handle_ws_message(message)
+        except ConnectionClosed:
+            return
+
+    async def _handle_ws_message(self, message: bytes) -> None:
+        self._last_ws_event_monotonic = time.monotonic()
+        # Skip the parse for frames that can't reach a job, e.g. status broadcasts
+        if not self.job_store.has_prompts():
+            return
+        if b'"prompt_id"' not in message and b'"id"' not in message:
+            return
+        try:
+            payload = orjson.loads(message)
+        except orjson.JSONDecodeError:
             return
 
         if not isinstance(payload, dict):
@@ -188,109 +358,117 @@ class ComfyClient:
         event_token = payload.get("type") or payload.get("event") or "update"
         detail = str(event_token)
         event_lower = detail.lower()
-
-        def clamp_percent(value: float | int | None) -> int | None:
-            if not isinstance(value, (int, float)):
-                return None
-            numeric = float(value)
-            if numeric != numeric or numeric in (float('inf'), float('-inf')):
-                return None
-            numeric = max(0.0, min(100.0, numeric))
-            return int(round(numeric))
-
-        progress_percent: int | None = None
-
-        if event_lower == "progress":
-            data = payload.get("data")
-            if isinstance(data, dict):
-                current = data.get("value")
-                total = data.get("max")
-                nodeId = data.get("node")
-                try:
-                    current_value = float(current)
-                    total_value = float(total)
-                    node_value = int(nodeId)
-                except (TypeError, ValueError):
-                    current_value = None
-                    total_value = None
-                else:
-                    if (
-                        current_value == current_value
-                        and total_value == total_value
-                        and total_value > 0
-                    ):
-                        capped_current = max(0.0, min(current_value, total_value))
-                        computed_percent = (capped_current / total_value) * 100.0
-                        if node_value==57:
-                            progress_percent = computed_percent * 0.40
-                        elif node_value==58:
-                            progress_percent = computed_percent * 0.40 + 40
-                        elif node_value==85:
-                            progress_percent = computed_percent * 0.20 + 80
-                        elif total_value < 10:
-                            progress_percent = computed_percent * 0.50
-                        
-                        progress_percent = clamp_percent(progress_percent)
-
-            detail = f"progress ({progress_percent}%)" if progress_percent is not None else "progress"
+        mapped_state, progress_percent = _HANDLERS.get(event_lower, _handle_generic)(payload, event_lower)
+        if progress_percent is not None:
+            detail = f"progress ({progress_percent}%)"
 
         new_state = job.state
-        if progress_percent is not None:
-            new_state = "completed" if progress_percent >= 100 else "running"
-        else:
-            lowered = detail.lower()
-            if any(token in lowered for token in ("start", "running", "execute")):
-                new_state = "running"
-                # Track this prompt as the last running one for queue polling
-                self._last_running_prompt = prompt_id
-            elif any(token in lowered for token in ("complete", "finish", "done")):
-                new_state = "completed"
-                # Clear the last running prompt when completed
-                if self._last_running_prompt == prompt_id:
-                    self._last_running_prompt = None
-            elif any(token in lowered for token in ("fail", "error", "abort")):
-                new_state = "failed"
-                # Clear the last running prompt on failure
-                if self._last_running_prompt == prompt_id:
-                    self._last_running_prompt = None
-
-        self.job_store.upsert(
+        if mapped_state == "running":
+            new_state = mapped_state
+            # Track this prompt as the last running one for queue polling
+            self._last_running_prompt = prompt_id
+        elif mapped_state is not None:
+            new_state = mapped_state
+            # Clear the last running prompt once it completed or failed
+            if self._last_running_prompt == prompt_id:
+                self._last_running_prompt = None
+
+        self._record_job_update(
             job.job_id,
             state=new_state,
             detail=detail,
             prompt_id=prompt_id,
             progress=progress_percent,
-            gpu_id=self.gpu_id,
+            immediate=new_state != job.state,
         )
 
+    _UPDATE_FLUSH_INTERVAL = 0.075  # seconds between writes of coalesced websocket updates
+
+    def _record_job_update(
+        self,
+        job_id: str,
+        state: str,
+        detail: str | None,
+        prompt_id: str | None,
+        progress: int | None,
+        immediate: bool,
+    ) -> None:
+        """
+        Apply a websocket-driven job update. State changes (including completed/failed)
+        are written immediately, after any pending update for the job; updates that keep
+        the state, such as progress ticks, only replace the job's pending update and are
+        written by _update_flush_loop.
+        """
+        pending = self._pending_updates.pop(job_id, None)
+        if immediate:
+            if pending is not None:
+                self._write_pending_update(job_id, pending)
+            # Only the event's own progress: a completed event without one still ends at 100%
+            self.job_store.upsert(
+                job_id, state=state, detail=detail, prompt_id=prompt_id, progress=progress, gpu_id=self.gpu_id
+            )
+            return
+        if progress is None and pending is not None:
+            progress = pending["progress"]
+        self._pending_updates[job_id] = {"state": state, "detail": detail, "prompt_id": prompt_id, "progress": progress}
+
+    def _write_pending_update(self, job_id: str, update: dict[str, Any]) -> None:
+        job = self.job_store.get(job_id)
+        # Skip updates for a prompt the job no longer tracks (resubmitted, e.g. on another GPU)
+        if job is None or job.prompt_id != update["prompt_id"]:
+            return
+        self.job_store.upsert(job_id, gpu_id=self.gpu_id, **update)
+
+    def _flush_pending_updates(self) -> None:
+        if not self._pending_updates:
+            return
+        pending, self._pending_updates = self._pending_updates, {}
+        for job_id, update in pending.items():
+            self._write_pending_update(job_id, update)
+
+    async def _update_flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._UPDATE_FLUSH_INTERVAL)
+            self._flush_pending_updates()
+
     async def ping(self) -> bool:
+        if self._client is None:
+            return False
         try:
-            resp = await self._client.get(f"{self.base_url}/")
+            resp = await self._client.get(self._url_ping)
             return resp.status_code < 500
         except Exception:
             return False
 
+    _JSON_HEADERS = {"Content-Type": "application/json"}
     _SUBMIT_MAX_ATTEMPTS = 3
     _SUBMIT_RETRY_DELAY = 0.5  # seconds between retries
 
     async def submit_workflow(self, job_id: str, workflow: dict[str, Any]) -> Tuple[bool, str | None]:
         """Try to forward a workflow to ComfyUI, retrying on transient errors."""
+        if self._client is None:
+            return False, "ComfyUI client not started"
+        # A coalesced update for a previous submission of this job must not be flushed over the new one
+        self._pending_updates.pop(job_id, None)
         self.job_store.upsert(job_id, state='queued', detail=None, gpu_id=self.gpu_id)
         logger.info("Submitting workflow job_id=%s gpu_id=%s", job_id, self.gpu_id)
 
+        # Encode once: the same bytes are saved in dev mode and sent to ComfyUI
+        body = orjson.dumps(workflow)
+
         if self.dev_save_dir is not None:
             try:
-                self.dev_save_dir.mkdir(parents=True, exist_ok=True)
                 out_path = self.dev_save_dir / f"{job_id}.json"
-                out_path.write_text(json.dumps(workflow, indent=2, ensure_ascii=False), encoding='utf-8')
+                # Off the event loop so large workflows don't stall websocket handling
+                await asyncio.to_thread(out_path.write_bytes, body)
             except Exception:
                 pass
 
-        url = f"{self.base_url}/prompt"
         last_exc: Exception | None = None
         for attempt in range(1, self._SUBMIT_MAX_ATTEMPTS + 1):
             try:
-                resp = await self._client.post(url, json=workflow)
+                async with self._submit_sem:
+                    resp = await self._client.post(self._url_prompt, content=body, headers=self._JSON_HEADERS)
                 logger.info(
                     "ComfyUI response job_id=%s gpu_id=%s attempt=%s status=%s body=%s",
                     job_id,
@@ -335,12 +513,14 @@ class ComfyClient:
 
     async def _poll_queue(self) -> None:
         """Poll ComfyUI queue endpoint to check for job status updates."""
+        # Decide on up-to-date job progress
+        self._flush_pending_updates()
         try:
-            resp = await self._client.get(f"{self.base_url}/queue")
+            resp = await self._client.get(self._url_queue)
             if resp.status_code != 200:
                 return
 
-            queue_data = resp.json()
+            queue_data = orjson.loads(resp.content)
             if not isinstance(queue_data, dict):
                 return
 
@@ -359,6 +539,9 @@ class ComfyClient:
                 if self._last_running_prompt:
                     job = self.job_store.find_by_prompt_id(self._last_running_prompt, gpu_id=self.gpu_id)
                     if job and job.state in ("running", "submitted"):
+                        # Websocket frames received during the GET above must not be
+                        # flushed over the terminal state written here
+                        self._pending_updates.pop(job.job_id, None)
                         if (job.progress or 0) >= 80:
                             logger.warning(
                                 "Queue poll: job_id=%s prompt_id=%s gpu_id=%s completed at %s%% progress",
@@ -390,9 +573,17 @@ class ComfyClient:
             # Silently ignore polling errors
             pass
 
+    _QUEUE_POLL_INTERVAL = 5.0  # seconds, while the websocket is quiet
+    _QUEUE_POLL_INTERVAL_WS_ACTIVE = 30.0  # seconds, while the websocket delivers events
+    _WS_IDLE_AFTER = 10.0  # seconds without websocket events before polling speeds up
+
     async def _queue_polling_loop(self) -> None:
-        """Periodically poll the queue endpoint every 5 seconds."""
+        """Poll the queue endpoint as a fallback, backing off while the websocket is active."""
         while True:
-            await self._poll_queue()
-            await asyncio.sleep(5.0)
-
+            if self._last_running_prompt is not None or self.job_store.has_active_jobs(gpu_id=self.gpu_id):
+                await self._poll_queue()
+            ws_idle = time.monotonic() - self._last_ws_event_monotonic
+            if ws_idle > self._WS_IDLE_AFTER:
+                await asyncio.sleep(self._QUEUE_POLL_INTERVAL)
+            else:
+                await asyncio.sleep(self._QUEUE_POLL_INTERVAL_WS_ACTIVE)
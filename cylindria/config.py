@@ -1,5 +1,6 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
@@ -14,14 +15,27 @@ def _int_from_env(var_name: str, default: int) -> int:
         return default
 
 
+def _default_dev_save_dir() -> str:
+    return os.getenv("CYLINDRIA_DEV_SAVE_DIR") or str(Path("workflows_dev").resolve())
+
+
+# Defaults are read from the environment when Settings() is built, not at import
 @dataclass
 class Settings:
-    comfyui_base_url: str = os.getenv("COMFYUI_BASE_URL", "http://127.0.0.1:8188").rstrip("/")
-    number_of_gpus: int = _int_from_env("CYLINDRIA_NUM_GPUS", 1)
-    api_key: str | None = os.getenv("CYLINDRIA_API_KEY")
+    comfyui_base_url: str = field(
+        default_factory=lambda: os.getenv("COMFYUI_BASE_URL", "http://127.0.0.1:8188").rstrip("/")
+    )
+    number_of_gpus: int = field(default_factory=lambda: _int_from_env("CYLINDRIA_NUM_GPUS", 1))
+    api_key: str | None = field(default_factory=lambda: os.getenv("CYLINDRIA_API_KEY"))
+    # Upper bound on concurrent workflow POSTs to each ComfyUI instance
+    max_concurrent_submits: int = field(
+        default_factory=lambda: _int_from_env("CYLINDRIA_MAX_CONCURRENT_SUBMITS", 4)
+    )
     # Dev mode: save workflow JSONs before forwarding to ComfyUI
-    dev_mode: bool = os.getenv("CYLINDRIA_DEV_MODE", "0").lower() in {"1", "true", "yes", "on"}
-    dev_save_dir: Optional[str] = os.getenv("CYLINDRIA_DEV_SAVE_DIR") or str(Path("workflows_dev").resolve())
+    dev_mode: bool = field(
+        default_factory=lambda: os.getenv("CYLINDRIA_DEV_MODE", "0").lower() in {"1", "true", "yes", "on"}
+    )
+    dev_save_dir: Optional[str] = field(default_factory=_default_dev_save_dir)
 
     def __post_init__(self) -> None:
         # Clamp GPU count to supported range (1-8)
@@ -30,7 +44,13 @@ class Settings:
         except (TypeError, ValueError):
             number = 1
         self.number_of_gpus = max(1, min(8, number))
+        try:
+            self.max_concurrent_submits = max(1, int(self.max_concurrent_submits))
+        except (TypeError, ValueError):
+            self.max_concurrent_submits = 4
 
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
+    """Build Settings once per process; env changes after the first call are not picked up."""
     return Settings()
@@ -1,15 +1,51 @@
 from __future__ import annotations
 
 import math
+import time
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Dict, Optional
 
+import orjson
+
 from .models import JobStatusResponse
 
 
+@dataclass(slots=True)
+class JobRecord:
+    """In-memory job state; converted to JobStatusResponse only at the API boundary."""
+
+    job_id: str
+    state: str
+    submitted_at: float  # epoch seconds
+    updated_at: float  # epoch seconds
+    progress: int = 0
+    detail: str | None = None
+    prompt_id: str | None = None
+    gpu_id: int | None = None
+
+    def to_response(self) -> JobStatusResponse:
+        return JobStatusResponse(
+            job_id=self.job_id,
+            state=self.state,
+            gpu_id=self.gpu_id,
+            submitted_at=datetime.fromtimestamp(self.submitted_at, tz=timezone.utc),
+            updated_at=datetime.fromtimestamp(self.updated_at, tz=timezone.utc),
+            progress=self.progress,
+            detail=self.detail,
+            prompt_id=self.prompt_id,
+        )
+
+
 class JobStore:
+    _PROGRESS_DEBOUNCE = 0.05  # seconds; unchanged progress within this window is not rewritten
+
     def __init__(self) -> None:
-        self._jobs: Dict[str, JobStatusResponse] = {}
+        self._jobs: Dict[str, JobRecord] = {}
+        # Serialized form of each job, built on first read and dropped on every upsert
+        self._json_cache: Dict[str, bytes] = {}
+        # prompt_id -> job_id, so websocket events don't scan every job
+        self._by_prompt: Dict[str, str] = {}
 
     @staticmethod
     def _normalize_progress(progress: float | int | None) -> int | None:
@@ -32,20 +68,36 @@ class JobStore:
         prompt_id: str | None = None,
         progress: float | int | None = None,
         gpu_id: int | None = None,
-    ) -> JobStatusResponse:
-        now = datetime.now(timezone.utc)
+    ) -> JobRecord:
+        now = time.time()
         normalized_progress = self._normalize_progress(progress)
         completed_without_progress = normalized_progress is None and state == 'completed'
 
-        if job_id in self._jobs:
-            js = self._jobs[job_id]
+        js = self._jobs.get(job_id)
+        if js is not None:
+            if (
+                normalized_progress is not None
+                and normalized_progress == js.progress
+                and state == js.state
+                and (detail is None or detail == js.detail)
+                and (prompt_id is None or prompt_id == js.prompt_id)
+                and (gpu_id is None or gpu_id == js.gpu_id)
+                and now - js.updated_at < self._PROGRESS_DEBOUNCE
+            ):
+                # Repeated progress tick with nothing new to record
+                return js
+            self._json_cache.pop(job_id, None)
             js.state = state
             js.updated_at = now
             if gpu_id is not None:
                 js.gpu_id = gpu_id
             if detail is not None:
                 js.detail = detail
-            if prompt_id is not None:
+            if prompt_id is not None and prompt_id != js.prompt_id:
+                # Resubmitted job: drop the index entry for its previous prompt
+                if js.prompt_id is not None and self._by_prompt.get(js.prompt_id) == job_id:
+                    del self._by_prompt[js.prompt_id]
+                self._by_prompt[prompt_id] = job_id
                 js.prompt_id = prompt_id
             if normalized_progress is not None:
                 js.progress = max(js.progress, normalized_progress)
@@ -53,29 +105,57 @@ class JobStore:
                 js.progress = max(js.progress, 100)
         else:
             initial_progress = 100 if completed_without_progress else (normalized_progress or 0)
-            js = JobStatusResponse(
+            js = JobRecord(
                 job_id=job_id,
                 state=state,
-                gpu_id=gpu_id,
                 submitted_at=now,
                 updated_at=now,
                 progress=initial_progress,
                 detail=detail,
                 prompt_id=prompt_id,
+                gpu_id=gpu_id,
             )
             self._jobs[job_id] = js
+            if prompt_id is not None:
+                self._by_prompt[prompt_id] = job_id
         return js
 
-    def get(self, job_id: str) -> Optional[JobStatusResponse]:
+    def get(self, job_id: str) -> Optional[JobRecord]:
         return self._jobs.get(job_id)
 
-    def find_by_prompt_id(self, prompt_id: str, gpu_id: int | None = None) -> Optional[JobStatusResponse]:
+    def get_json(self, job_id: str) -> Optional[bytes]:
+        """Return the job serialized as JSON bytes, or None if unknown."""
+        cached = self._json_cache.get(job_id)
+        if cached is not None:
+            return cached
+        js = self._jobs.get(job_id)
+        if js is None:
+            return None
+        cached = orjson.dumps(js.to_response().model_dump(), option=orjson.OPT_UTC_Z)
+        self._json_cache[job_id] = cached
+        return cached
+
+    def find_by_prompt_id(self, prompt_id: str, gpu_id: int | None = None) -> Optional[JobRecord]:
+        job_id = self._by_prompt.get(prompt_id)
+        if job_id is None:
+            return None
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if gpu_id is not None and job.gpu_id is not None and job.gpu_id != gpu_id:
+            return None
+        return job
+
+    def has_prompts(self) -> bool:
+        """Return True if any job has been matched to a ComfyUI prompt_id."""
+        return bool(self._by_prompt)
+
+    def has_active_jobs(self, gpu_id: int | None = None) -> bool:
+        """Return True if any job (optionally on one GPU) is submitted or running."""
         for job in self._jobs.values():
-            if job.prompt_id != prompt_id:
+            if job.state not in ("submitted", "running"):
                 continue
-            if gpu_id is not None and job.gpu_id is not None and job.gpu_id != gpu_id:
+            if gpu_id is not None and job.gpu_id != gpu_id:
                 continue
-            return job
-        return None
-
-
+            return True
+        return False
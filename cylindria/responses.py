@@ -0,0 +1,11 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson instead of the stdlib encoder."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
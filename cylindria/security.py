@@ -1,19 +1,28 @@
-from fastapi import Depends, Header, HTTPException, status
+from typing import Callable
 
-from .config import get_settings, Settings
+from fastapi import Header, HTTPException, status
 
+from .config import Settings
 
-def require_api_key(
-    x_api_key: str | None = Header(default=None, alias="X-API-Key"),
-    settings: Settings = Depends(get_settings),
-) -> str | None:
+
+def build_api_key_guard(settings: Settings) -> Callable[..., str | None]:
     """
-    If CYLINDRIA_API_KEY is set in the environment, enforce X-API-Key header.
-    If not set, allow requests without authentication.
+    Build the X-API-Key dependency for an app from the settings it was created with,
+    so requests don't re-resolve get_settings() through the dependency graph.
     """
-    if settings.api_key is None:
-        return None
-    if x_api_key != settings.api_key:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing API key")
-    return x_api_key
+    expected_key = settings.api_key
+
+    def require_api_key(
+        x_api_key: str | None = Header(default=None, alias="X-API-Key"),
+    ) -> str | None:
+        """
+        If CYLINDRIA_API_KEY is set in the environment, enforce X-API-Key header.
+        If not set, allow requests without authentication.
+        """
+        if expected_key is None:
+            return None
+        if x_api_key != expected_key:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing API key")
+        return x_api_key
 
+    return require_api_key
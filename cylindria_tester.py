@@ -1,14 +1,73 @@
+import asyncio
 import json
-import uuid
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional
 
 import tkinter as tk
-from tkinter import filedialog, simpledialog, messagebox
+from tkinter import simpledialog, messagebox
 from tkinter.scrolledtext import ScrolledText
 
 import httpx
 
+try:
+    import orjson
+except ImportError:  # the tester also runs with just httpx installed
+    orjson = None
+
+_END = tk.END
+_JSON_HEADERS = {"Content-Type": "application/json"}
+_JSON_CONTENT_TYPES = ("application/json", "application/problem+json")
+
+
+def _json_loads(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    # The stdlib parser doesn't take memoryviews
+    return json.loads(bytes(data))
+
+
+@lru_cache(maxsize=16)
+def _is_json(content_type: str) -> bool:
+    # Servers repeat the same few header values, so classify each one once
+    return content_type.split(";", 1)[0].strip().lower() in _JSON_CONTENT_TYPES
+
+
+def _parse_response(r: httpx.Response):
+    """Decoded JSON body for JSON responses (parsed straight from the bytes), else the text."""
+    if _is_json(r.headers.get("content-type", "")):
+        return _json_loads(r.content)
+    return r.text
+
+
+def _json_pretty(data) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+class WideEntryDialog(simpledialog.Dialog):
+    def __init__(self, parent, title, prompt, initial, width):
+        self._prompt = prompt
+        self._initial = initial
+        self._width = width
+        super().__init__(parent, title)
+
+    def body(self, master):
+        tk.Label(master, text=self._prompt).grid(row=0, column=0, sticky="w")
+        self.entry = tk.Entry(master, width=self._width)
+        self.entry.grid(row=1, column=0, sticky="we", pady=(4, 0))
+        if self._initial:
+            self.entry.insert(0, self._initial)
+            self.entry.select_range(0, tk.END)
+        return self.entry
+
+    def apply(self):
+        self.result = self.entry.get().strip()
+
 
 @dataclass
 class UIState:
@@ -27,14 +86,19 @@ class CylindriaTesterApp:
         top.pack(fill=tk.X, padx=8, pady=(8, 4))
 
         tk.Label(top, text="Cylindria URL:").grid(row=0, column=0, sticky=tk.W)
-        self.entry_url = tk.Entry(top, width=40)
+        self.url_var = tk.StringVar(value="http://127.0.0.1")
+        self.entry_url = tk.Entry(top, width=40, textvariable=self.url_var)
         self.entry_url.grid(row=0, column=1, sticky=tk.W, padx=(4, 8))
-        self.entry_url.insert(0, "http://127.0.0.1")
 
         tk.Label(top, text="Port:").grid(row=0, column=2, sticky=tk.W)
-        self.entry_port = tk.Entry(top, width=8)
+        self.port_var = tk.StringVar(value="8100")
+        self.entry_port = tk.Entry(top, width=8, textvariable=self.port_var)
         self.entry_port.grid(row=0, column=3, sticky=tk.W, padx=(4, 0))
-        self.entry_port.insert(0, "8100")
+
+        # Validated base URL, reset whenever the URL or port text changes (typing or pasting)
+        self._base_cache: Optional[str] = None
+        self.url_var.trace_add("write", self._invalidate_base_url)
+        self.port_var.trace_add("write", self._invalidate_base_url)
 
         tk.Label(top, text="Gpu Id:").grid(row=1, column=0, sticky=tk.W, pady=(4, 0))
         self.entry_gpu = tk.Entry(top, width=8)
@@ -54,18 +118,62 @@ class CylindriaTesterApp:
         self.btn_job = tk.Button(btns, text="Job Status", command=self.on_job_status)
         self.btn_job.pack(side=tk.LEFT, padx=(0, 6))
 
+        self.btn_watch = tk.Button(btns, text="Watch Job", command=self.on_toggle_watch)
+        self.btn_watch.pack(side=tk.LEFT, padx=(0, 6))
+
         self.btn_clear = tk.Button(btns, text="Clear Output", command=self.on_clear_output)
         self.btn_clear.pack(side=tk.LEFT, padx=(0, 6))
 
         # Output text area
         self.output = ScrolledText(root, height=20, undo=False, wrap=tk.WORD)
         self.output.pack(fill=tk.BOTH, expand=True, padx=8, pady=(0, 8))
-        self.output.configure(font=("Consolas", 10))
+        # Undo is off; also skip the undo-stack bookkeeping Tk still does per insert
+        self.output.configure(font=("Consolas", 10), maxundo=0, autoseparators=False)
+        # Bound once: log() runs for every line of output
+        self._log_insert = self.output.insert
+        self._log_see = self.output.see
+        self._log_counter = 0
+        # Receive buffer reused across job status polls, see _fetch_job_status
+        self._rx_buf = bytearray(self._READ_CHUNK)
+
+        # HTTP client; one keep-alive pool reused by every button
+        self.client = httpx.Client(
+            timeout=httpx.Timeout(5.0, connect=2.0),
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20, keepalive_expiry=30.0),
+        )
+        # HTTP calls run here; results are handed back to Tk with root.after
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cylindria-http")
+
+        # Watch Job polls from an asyncio loop on its own daemon thread
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="cylindria-watch", daemon=True).start()
+        self._aclient = httpx.AsyncClient(
+            timeout=httpx.Timeout(5.0, connect=2.0),
+            limits=httpx.Limits(max_keepalive_connections=2, max_connections=4, keepalive_expiry=30.0),
+        )
+        self._watch_future: Optional[Future] = None
+        # Bumped on every start/stop so results from an older watch are ignored
+        self._watch_generation = 0
+
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+
+    def _on_close(self) -> None:
+        self._stop_watch(quiet=True)
+        try:
+            asyncio.run_coroutine_threadsafe(self._aclient.aclose(), self._loop).result(timeout=1.0)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.client.close()
+        self.root.destroy()
 
-        # HTTP client
-        self.client = httpx.Client(timeout=httpx.Timeout(5.0, connect=2.0))
+    def _invalidate_base_url(self, *_args) -> None:
+        self._base_cache = None
 
     def base_url(self) -> Optional[str]:
+        if self._base_cache is not None:
+            return self._base_cache
         raw = (self.entry_url.get() or "").strip().rstrip("/")
         port = (self.entry_port.get() or "").strip()
         if not raw:
@@ -74,7 +182,8 @@ class CylindriaTesterApp:
         if not port.isdigit():
             messagebox.showerror("Input Error", "Please enter a numeric port (e.g. 8000)")
             return None
-        return f"{raw}:{port}"
+        self._base_cache = f"{raw}:{port}"
+        return self._base_cache
 
     def gpu_id_value(self) -> Optional[int]:
         raw = (self.entry_gpu.get() or "").strip()
@@ -90,21 +199,92 @@ class CylindriaTesterApp:
             return None
         return value
 
+    _LOG_CHUNK = 64 * 1024  # characters per insert for large payloads
+    _LOG_CHUNKS_PER_IDLE = 8  # let Tk redraw after this many chunks
+    _LOG_MAX_LINES = 5000  # scrollback kept in the output pane
+    _LOG_TRIM_EVERY = 64  # messages between line-count checks
+
     def log(self, text: str) -> None:
-        self.output.insert(tk.END, text + "\n")
-        self.output.see(tk.END)
+        insert = self._log_insert
+        if len(text) <= self._LOG_CHUNK:
+            # Text and newline as two (chars, tags) pairs of one insert, without concatenating
+            insert(_END, text, (), "\n")
+        else:
+            self._insert_chunked(text)
+            insert(_END, "\n")
+        self._after_log()
+
+    def _insert_chunked(self, text: str) -> None:
+        """Insert a large payload in slices so Tk can redraw in between."""
+        insert = self._log_insert
+        chunk = self._LOG_CHUNK
+        for n, start in enumerate(range(0, len(text), chunk), 1):
+            insert(_END, text[start:start + chunk])
+            if n % self._LOG_CHUNKS_PER_IDLE == 0:
+                self.root.update_idletasks()
+
+    def _after_log(self) -> None:
+        """Scrollback trim check and scroll to the end, once per logged message."""
+        self._log_counter += 1
+        if self._log_counter % self._LOG_TRIM_EVERY == 0:
+            self._trim_output()
+        self._log_see(_END)
+
+    def _trim_output(self) -> None:
+        """Drop the oldest lines beyond _LOG_MAX_LINES."""
+        lines = int(self.output.index("end-1c").split(".", 1)[0])
+        excess = lines - self._LOG_MAX_LINES
+        if excess > 0:
+            self.output.delete("1.0", f"{excess + 1}.0")
 
     def on_clear_output(self) -> None:
         self.output.delete('1.0', tk.END)
 
     def log_json(self, title: str, data) -> None:
-        self.log(f"=== {title} ===")
-        try:
-            pretty = json.dumps(data, indent=2, ensure_ascii=False)
-        except Exception:
-            pretty = str(data)
-        self.log(pretty)
-        self.log("")
+        if isinstance(data, str):
+            # Non-JSON response text: show it as-is
+            pretty = data
+        elif isinstance(data, bytes):
+            pretty = data.decode("utf-8", "replace")
+        else:
+            try:
+                pretty = _json_pretty(data)
+            except Exception:
+                pretty = str(data)
+        header = f"=== {title} ===\n"
+        if len(pretty) <= self._LOG_CHUNK:
+            # Header, payload and blank line in one insert and one scroll
+            self._log_insert(_END, header, (), pretty, (), "\n\n")
+            self._after_log()
+        else:
+            # Header and blank line around the sliced payload, without copying it into one string
+            self._log_insert(_END, header)
+            self._insert_chunked(pretty)
+            self._log_insert(_END, "\n\n")
+            self._after_log()
+
+    def _run_request(self, button: tk.Button, request, on_done) -> None:
+        """
+        Run request() on a worker thread so the window stays responsive, then call
+        on_done(response, error) back on the Tk thread. The button stays disabled meanwhile.
+        """
+        button.config(state=tk.DISABLED)
+        future = self._executor.submit(request)
+
+        def done(f: Future) -> None:
+            try:
+                self.root.after(0, self._finish_request, f, button, on_done)
+            except (RuntimeError, tk.TclError):
+                pass  # window already closed
+
+        future.add_done_callback(done)
+
+    def _finish_request(self, future: Future, button: tk.Button, on_done) -> None:
+        button.config(state=tk.NORMAL)
+        error = future.exception()
+        if error is not None and not isinstance(error, httpx.HTTPError):
+            raise error
+        on_done(future.result() if error is None else None, error)
 
     def on_server_status(self) -> None:
         base = self.base_url()
@@ -115,13 +295,16 @@ class CylindriaTesterApp:
             return
         url = f"{base}/serverstatus?GpuId={gpu_id}"
         self.log(f"GET {url}")
-        try:
-            r = self.client.get(url)
+
+        def on_done(r: Optional[httpx.Response], error: Optional[Exception]) -> None:
+            if error is not None:
+                messagebox.showerror("Request Error", f"Failed to reach server: {error}")
+                self.log(f"Error: {error}")
+                return
             self.log(f"HTTP {r.status_code}")
-            self.log_json("ServerStatus", r.json() if r.headers.get("content-type", "").startswith("application/json") else r.text)
-        except httpx.HTTPError as e:
-            messagebox.showerror("Request Error", f"Failed to reach server: {e}")
-            self.log(f"Error: {e}")
+            self.log_json("ServerStatus", _parse_response(r))
+
+        self._run_request(self.btn_server, lambda: self.client.get(url), on_done)
 
     def on_start_job(self) -> None:
         base = self.base_url()
@@ -130,6 +313,8 @@ class CylindriaTesterApp:
         gpu_id = self.gpu_id_value()
         if gpu_id is None:
             return
+        from tkinter import filedialog  # only needed once a job is started
+
         file_path = filedialog.askopenfilename(
             title="Select ComfyUI Workflow (JSON)",
             filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
@@ -137,26 +322,34 @@ class CylindriaTesterApp:
         if not file_path:
             return
 
+        # Sent as-is: the server validates the JSON, so skip parsing and re-encoding it here
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                workflow = json.load(f)
-        except Exception as e:
-            messagebox.showerror("File Error", f"Failed to read JSON: {e}")
+            with open(file_path, "rb") as f:
+                body = f.read()
+        except OSError as e:
+            messagebox.showerror("File Error", f"Failed to read file: {e}")
             return
 
-        job_id = uuid.uuid4().hex
+        job_id = os.urandom(16).hex()
         url = f"{base}/startjob/{job_id}/?GpuId={gpu_id}"
         self.log(f"PUT {url}\nBody: workflow from {file_path}")
-        try:
-            r = self.client.put(url, json=workflow)
+
+        def on_done(r: Optional[httpx.Response], error: Optional[Exception]) -> None:
+            if error is not None:
+                messagebox.showerror("Request Error", f"Failed to send job: {error}")
+                self.log(f"Error: {error}")
+                return
             self.log(f"HTTP {r.status_code}")
-            payload = r.json() if r.headers.get("content-type", "").startswith("application/json") else r.text
+            payload = _parse_response(r)
             self.log_json("StartJob Response", payload)
             self.state.last_job_id = job_id
             self.log(f"Saved last job id: {job_id}\n")
-        except httpx.HTTPError as e:
-            messagebox.showerror("Request Error", f"Failed to send job: {e}")
-            self.log(f"Error: {e}")
+
+        self._run_request(
+            self.btn_start,
+            lambda: self.client.put(url, content=body, headers=_JSON_HEADERS),
+            on_done,
+        )
 
     def on_job_status(self) -> None:
         base = self.base_url()
@@ -169,36 +362,123 @@ class CylindriaTesterApp:
         job_id = job_id.strip()
         url = f"{base}/jobstatus/{job_id}/"
         self.log(f"GET {url}")
-        try:
-            r = self.client.get(url)
-            self.log(f"HTTP {r.status_code}")
-            payload = r.json() if r.headers.get("content-type", "").startswith("application/json") else r.text
+
+        def on_done(result, error: Optional[Exception]) -> None:
+            if error is not None:
+                messagebox.showerror("Request Error", f"Failed to query status: {error}")
+                self.log(f"Error: {error}")
+                return
+            status_code, payload = result
+            self.log(f"HTTP {status_code}")
             self.log_json("JobStatus Response", payload)
             self.state.last_job_id = job_id
-        except httpx.HTTPError as e:
-            messagebox.showerror("Request Error", f"Failed to query status: {e}")
-            self.log(f"Error: {e}")
 
-    def ask_wide_string(self, title: str, prompt: str, initialvalue: str = "", width: int = 60) -> Optional[str]:
-        class WideEntryDialog(simpledialog.Dialog):
-            def __init__(self, parent, title, prompt, initial, width):
-                self._prompt = prompt
-                self._initial = initial
-                self._width = width
-                super().__init__(parent, title)
-
-            def body(self, master):
-                tk.Label(master, text=self._prompt).grid(row=0, column=0, sticky="w")
-                self.entry = tk.Entry(master, width=self._width)
-                self.entry.grid(row=1, column=0, sticky="we", pady=(4, 0))
-                if self._initial:
-                    self.entry.insert(0, self._initial)
-                    self.entry.select_range(0, tk.END)
-                return self.entry
-
-            def apply(self):
-                self.result = self.entry.get().strip()
+        self._run_request(self.btn_job, lambda: self._fetch_job_status(url), on_done)
+
+    _READ_CHUNK = 64 * 1024
+
+    def _fetch_job_status(self, url: str):
+        """
+        GET url on the worker thread, reading the body in chunks and decoding it there.
+        Returns (status_code, payload) so the Tk thread only has to display it.
+        """
+        # Chunks are copied into the shared _rx_buf (only grown, never freed) instead of a
+        # fresh buffer per poll; the Job Status button keeps this to one request at a time
+        buf = self._rx_buf
+        size = 0
+        with self.client.stream("GET", url) as r:
+            for chunk in r.iter_bytes(self._READ_CHUNK):
+                end = size + len(chunk)
+                if end > len(buf):
+                    buf.extend(bytes(max(end - len(buf), len(buf))))
+                buf[size:end] = chunk
+                size = end
+            with memoryview(buf)[:size] as body:
+                if _is_json(r.headers.get("content-type", "")):
+                    payload = _json_loads(body)
+                else:
+                    payload = str(body, r.encoding or "utf-8", "replace")
+        return r.status_code, payload
+
+    _WATCH_INTERVAL = 2.0  # seconds between Watch Job polls
+
+    def on_toggle_watch(self) -> None:
+        if self._watch_future is not None:
+            self._stop_watch()
+            return
+        base = self.base_url()
+        if not base:
+            return
+        default = self.state.last_job_id or ""
+        job_id = self.ask_wide_string("Watch Job", "Enter Job ID:", initialvalue=default, width=60)
+        if not job_id:
+            return
+        job_id = job_id.strip()
+        url = f"{base}/jobstatus/{job_id}/"
+        self.state.last_job_id = job_id
+        self.log(f"Watching GET {url} every {self._WATCH_INTERVAL:g}s\n")
+        self._watch_generation += 1
+        self._watch_future = asyncio.run_coroutine_threadsafe(
+            self._watch_loop(url, self._watch_generation), self._loop
+        )
+        self._watch_future.add_done_callback(
+            lambda f, generation=self._watch_generation: self._on_watch_done(f, generation)
+        )
+        self.btn_watch.config(text="Stop Watch")
+
+    def _stop_watch(self, quiet: bool = False) -> None:
+        if self._watch_future is None:
+            return
+        self._watch_future.cancel()
+        self._watch_future = None
+        self._watch_generation += 1
+        self.btn_watch.config(text="Watch Job")
+        if not quiet:
+            self.log("Stopped watching\n")
+
+    async def _watch_loop(self, url: str, generation: int) -> None:
+        """Runs on the watch loop thread; each result is handed to the Tk thread."""
+        while True:
+            try:
+                r = await self._aclient.get(url)
+                result = (r.status_code, _parse_response(r), None)
+            except (httpx.HTTPError, ValueError) as e:
+                # ValueError: a JSON content type with a body that doesn't parse
+                result = (None, None, e)
+            try:
+                self.root.after(0, self._show_watch_result, generation, *result)
+            except (RuntimeError, tk.TclError):
+                return  # window already closed
+            await asyncio.sleep(self._WATCH_INTERVAL)
+
+    def _on_watch_done(self, future: Future, generation: int) -> None:
+        """Runs on the watch loop thread when _watch_loop ends."""
+        if future.cancelled() or future.exception() is None:
+            return
+        try:
+            self.root.after(0, self._watch_failed, generation, future.exception())
+        except (RuntimeError, tk.TclError):
+            pass  # window already closed
+
+    def _watch_failed(self, generation: int, error: BaseException) -> None:
+        if generation != self._watch_generation:
+            return
+        self.log(f"Watch stopped after error: {error!r}")
+        self._stop_watch(quiet=True)
 
+    def _show_watch_result(self, generation: int, status_code, payload, error) -> None:
+        if generation != self._watch_generation:
+            return
+        if error is not None:
+            self.log(f"Watch error: {error}")
+            return
+        self.log(f"HTTP {status_code}")
+        self.log_json("JobStatus (watch)", payload)
+        # Nothing more to see once the job has finished or if the server doesn't know it
+        if status_code == 404 or (isinstance(payload, dict) and payload.get("state") in ("completed", "failed")):
+            self._stop_watch()
+
+    def ask_wide_string(self, title: str, prompt: str, initialvalue: str = "", width: int = 60) -> Optional[str]:
         dlg = WideEntryDialog(self.root, title, prompt, initialvalue, width)
         return getattr(dlg, "result", None)
 